@@ -0,0 +1,146 @@
+"""Cache of images read from image series (see series() and stack())"""
+
+# Standard library imports
+from collections import OrderedDict, namedtuple
+from functools import update_wrapper
+import threading
+
+
+CacheInfo = namedtuple(
+    'CacheInfo',
+    ['hits', 'misses', 'maxsize', 'currsize', 'maxbytes', 'nbytes'],
+)
+
+
+class ImageCache:
+    """LRU cache of images, bounded in number of images and/or total bytes."""
+
+    def __init__(self, maxsize=516, maxbytes=None):
+        """Parameters
+           ----------
+
+        - maxsize: max number of images to keep (None: no limit)
+        - maxbytes: max total size of images in bytes (None: no limit)
+        """
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._init_storage()
+
+    def _init_storage(self):
+        self.images = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def _is_full(self):
+        if self.maxsize is not None and len(self.images) > self.maxsize:
+            return True
+        if self.maxbytes is not None and self.nbytes > self.maxbytes:
+            return True
+        return False
+
+    def get(self, key):
+        """Return cached image (None if not in cache)"""
+        with self.lock:
+            try:
+                img = self.images[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.images.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def put(self, key, img):
+        """Store image, removing least recently used ones if cache is full"""
+        with self.lock:
+            if key in self.images:
+                self.nbytes -= self.images.pop(key).nbytes
+            self.images[key] = img
+            self.nbytes += img.nbytes
+            while self.images and self._is_full():
+                _, old_img = self.images.popitem(last=False)
+                self.nbytes -= old_img.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.images.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        with self.lock:
+            return CacheInfo(
+                hits=self.hits,
+                misses=self.misses,
+                maxsize=self.maxsize,
+                currsize=len(self.images),
+                maxbytes=self.maxbytes,
+                nbytes=self.nbytes,
+            )
+
+    def __getstate__(self):
+        # Cached images and lock are not transferred (e.g. to other processes)
+        return {'maxsize': self.maxsize, 'maxbytes': self.maxbytes}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_storage()
+
+
+class cached_read:
+    """Decorator to cache images returned by the read() method of a series.
+
+    Each series object has its own ImageCache (so that images are freed with
+    the object), and images.read.cache_clear() / images.read.cache_info()
+    can be used as with functools.lru_cache.
+    """
+
+    def __init__(self, maxsize=516, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+
+    def __call__(self, read):
+        self.read = read
+        update_wrapper(self, read)
+        return self
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            img_cache = obj.__dict__['img_cache']
+        except KeyError:
+            img_cache = ImageCache(maxsize=self.maxsize, maxbytes=self.maxbytes)
+            obj.__dict__['img_cache'] = img_cache
+        return CachedRead(read=self.read.__get__(obj, objtype), img_cache=img_cache)
+
+
+class CachedRead:
+    """read() method of a series object, bound to the object's image cache"""
+
+    def __init__(self, read, img_cache):
+        self.read = read
+        self.img_cache = img_cache
+
+    def __call__(self, num=0, transform=True, **kwargs):
+        # Options left to their default (True) do not change the image,
+        # e.g. read(3) and read(num=3, rotation=True) share the same entry
+        options = tuple(sorted(
+            (name, value) for name, value in kwargs.items() if value is not True
+        ))
+        key = num, bool(transform), options
+
+        img = self.img_cache.get(key)
+        if img is None:
+            img = self.read(num, transform=transform, **kwargs)
+            self.img_cache.put(key, img)
+        return img
+
+    def cache_clear(self):
+        self.img_cache.clear()
+
+    def cache_info(self):
+        return self.img_cache.info()
@@ -36,10 +36,15 @@ IMAGE_TRANSFORMS = (
     'threshold',
 )
 
+# Folder where reference images for subtraction are stored between sessions
+# (e.g. Path.home() / '.cache' / 'imgseries'); None to not store them.
+REFERENCE_CACHE = None
+
 CONFIG = {
     'csv separator': csv_separator,
     'filenames': FILENAMES,
     'image transforms': IMAGE_TRANSFORMS,
     'image corrections': IMAGE_CORRECTIONS,
     'checked modules': checked_modules,
+    'reference cache': REFERENCE_CACHE,
 }
@@ -2,15 +2,19 @@
 
 # Standard library imports
 import json
+import math
+import os
+from functools import lru_cache
 
 # Nonstandard
+import cv2
 import skimage
 from skimage import io
-from skimage import filters
 import imgbasics
-from imgbasics.transform import rotate
 import numpy as np
 import pandas as pd
+from scipy import ndimage, signal
+import tifffile
 
 # local imports
 from .config import CONFIG
@@ -19,6 +23,17 @@ from .config import CONFIG
 PIXEL_DEPTHS = {'uint8': 2**8 - 1,
                 'uint16': 2**16 - 1}
 
+# Luminance weights of R, G, B channels (same as skimage.color.rgb2gray)
+GREY_WEIGHTS = (0.2125, 0.7154, 0.0721)
+
+# Interpolation orders (as in scikit-image) and corresponding OpenCV flags
+INTERPOLATION_ORDERS = {0: cv2.INTER_NEAREST,
+                        1: cv2.INTER_LINEAR,
+                        3: cv2.INTER_CUBIC}
+
+# Above this sigma, exact gaussian filtering is done by FFT convolution
+FFT_MIN_SIGMA = 5
+
 
 def max_pixel_range(img):
     """Return max pixel value depending on img type, for use in plt.imshow.
@@ -34,6 +49,9 @@ def max_pixel_range(img):
     dtype_name = img.dtype.name
 
     if 'float' in dtype_name:
+        vmin, vmax = img.min(), img.max()
+        if np.isfinite(vmin) and np.isfinite(vmax):  # no nan nor inf in image
+            return vmin, vmax
         img_finite = img[np.isfinite(img)]  # remove nan and inf
         return img_finite.min(), img_finite.max()
 
@@ -43,6 +61,157 @@ def max_pixel_range(img):
     return 0, PIXEL_DEPTHS.get(img.dtype.name, None)
 
 
+@lru_cache(maxsize=32)
+def rotation_matrix(angle, sx, sy):
+    """Affine matrix and output size (sx, sy) for rotation with resized frame.
+
+    Cached because the same angle / image size is used for all images of a
+    series; the returned matrix must not be modified in place.
+    """
+    theta = np.deg2rad(angle)
+    cos_theta = abs(np.cos(theta))
+    sin_theta = abs(np.sin(theta))
+
+    sx_new = sx * cos_theta + sy * sin_theta
+    sy_new = sx * sin_theta + sy * cos_theta
+
+    # translate rotation matrix so that the result fits into the new frame
+    matrix = cv2.getRotationMatrix2D((sx / 2, sy / 2), angle, scale=1)
+    matrix[:, 2] += (sx_new - sx) / 2, (sy_new - sy) / 2
+
+    output_size = int(sx_new), int(sy_new)
+    return matrix, output_size
+
+
+def gaussian_filter(img, sigma):
+    """Gaussian blur as two 1D passes along y and x (float32 or float64 output).
+
+    Color channels (if any) are filtered independently.
+    Same border mode / kernel truncation as skimage.filters.gaussian().
+    """
+    if sigma > FFT_MIN_SIGMA and (img.dtype.kind in 'biu' or np.isfinite(img).all()):
+        return gaussian_filter_fft(img, sigma)
+    img_filtered = img.astype(np.result_type(img.dtype, np.float32))
+    if not sigma:
+        return img_filtered
+    for axis in (0, 1):
+        ndimage.gaussian_filter1d(
+            img_filtered,
+            sigma=sigma,
+            axis=axis,
+            mode='nearest',
+            truncate=4.0,
+            output=img_filtered,
+        )
+    return img_filtered
+
+
+def gaussian_filter_fft(img, sigma):
+    """Same as gaussian_filter(), but with FFT convolutions along y and x.
+
+    Cost does not depend much on sigma, which makes it faster for large
+    sigmas. Not for images containing nan or inf (they spread everywhere).
+    Convolutions are done in double precision (as in scipy.ndimage), so that
+    e.g. uniform integer images are returned unchanged after truncation.
+    """
+    dtype = np.result_type(img.dtype, np.float32)
+
+    # Same kernel as scipy.ndimage.gaussian_filter1d
+    radius = int(4.0 * sigma + 0.5)
+    x = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (x / sigma)**2)
+    kernel = kernel / kernel.sum()
+
+    # Edge padding is equivalent to mode='nearest'
+    pad_width = [(radius, radius)] * 2 + [(0, 0)] * (img.ndim - 2)
+    img_filtered = np.pad(img.astype(np.float64), pad_width, mode='edge')
+
+    for axis in (0, 1):
+        shape = [1] * img.ndim
+        shape[axis] = kernel.size
+        img_filtered = signal.fftconvolve(
+            img_filtered,
+            kernel.reshape(shape),
+            mode='same',
+            axes=axis,
+        )
+
+    img_filtered = img_filtered[radius:-radius, radius:-radius]
+    return np.ascontiguousarray(img_filtered, dtype=dtype)
+
+
+def box_sizes(sigma, n=3):
+    """Widths of n successive box filters approximating a gaussian (sigma)."""
+    w_ideal = np.sqrt(12 * sigma**2 / n + 1)
+    w_low = int(w_ideal)
+    if w_low % 2 == 0:
+        w_low -= 1
+    w_up = w_low + 2
+    m_ideal = (12 * sigma**2 - n * w_low**2 - 4 * n * w_low - 3 * n) / (-4 * w_low - 4)
+    m = round(m_ideal)
+    return [w_low if i < m else w_up for i in range(n)]
+
+
+def box_blur(img, sigma):
+    """Approximate gaussian blur with three successive box filters.
+
+    Cost per pixel does not depend on sigma (running sums).
+    """
+    img_filtered = img.astype(np.result_type(img.dtype, np.float32))
+    for width in box_sizes(sigma):
+        cv2.boxFilter(
+            img_filtered,
+            ddepth=-1,
+            ksize=(width, width),
+            dst=img_filtered,
+            borderType=cv2.BORDER_REPLICATE,
+        )
+    return img_filtered
+
+
+def gaussian_filter_approx(img, sigma):
+    """Fast approximation of gaussian_filter() for large sigmas.
+
+    - sigma > 10: the image is downsampled, blurred and upsampled back.
+      Downsampling (area) and upsampling (bilinear) act as a small blur
+      themselves, which is compensated by blurring the small image a bit less.
+    - 5 < sigma <= 10: three successive box blurs.
+    - sigma <= 5: exact gaussian_filter()
+    """
+    if sigma <= 5:
+        return gaussian_filter(img, sigma)
+
+    if sigma <= 10:
+        return box_blur(img, sigma)
+
+    img_float = img.astype(np.result_type(img.dtype, np.float32))
+    sy, sx, *_ = img.shape
+    scale = int(sigma / 4)
+    size_small = max(sx // scale, 1), max(sy // scale, 1)
+
+    img_small = cv2.resize(img_float, size_small, interpolation=cv2.INTER_AREA)
+
+    # variance of area downsampling ~ scale^2 / 12, of linear upsampling ~ scale^2 / 6
+    sigma_small = np.sqrt(sigma**2 - scale**2 / 4) / scale
+    img_small = gaussian_filter(img_small, sigma_small)
+
+    return cv2.resize(img_small, (sx, sy), interpolation=cv2.INTER_LINEAR)
+
+
+def integer_threshold(img, vmin, vmax):
+    """(img >= vmin) & (img <= vmax) for 2D uint8/uint16 images, with OpenCV.
+
+    Bounds are rounded inwards so that the result is the same as with
+    non-integer bounds.
+    """
+    lower = max(math.ceil(vmin), 0)
+    upper = min(math.floor(vmax), PIXEL_DEPTHS[img.dtype.name])
+    if lower > upper:
+        return np.zeros(img.shape, dtype=bool)
+    mask = cv2.inRange(np.ascontiguousarray(img), lower, upper)  # 0 or 255
+    return mask.astype(bool)
+
+
 class ImageManager:
 
     @staticmethod
@@ -50,6 +219,18 @@ class ImageManager:
         """load file into image array (file: pathlib Path object)."""
         return io.imread(file)
 
+    @staticmethod
+    def write_image(file, img):
+        """save image array to file (file: str or pathlib Path object)."""
+        _, extension = os.path.splitext(file)
+        if extension.lower() in ('.tif', '.tiff'):
+            # tifffile directly, without going through skimage / imageio
+            if img.dtype == bool:  # same as skimage.io.imsave
+                img = img.astype(np.uint8) * 255
+            tifffile.imwrite(file, img)
+        else:
+            io.imsave(file, img)
+
     @staticmethod
     def read_tiff_stack_slice(file, num):
         """load file into image array (file: pathlib Path object)."""
@@ -60,36 +241,91 @@ class ImageManager:
         """load file into image array (file: pathlib Path object)."""
         return io.imread(file)
 
+    @staticmethod
+    def read_tiff_stack_memmap(file):
+        """memory-map stack file as an array (file: pathlib Path object).
+
+        Raises ValueError if the data is not memory-mappable (e.g. compressed).
+        """
+        return tifffile.memmap(file, mode='r')
+
     # =========== Define how to transform images (crop, rotate, etc.) ============
 
     @staticmethod
-    def rotate(img, angle):
-        """Rotate an image by a given angle"""
-        return rotate(img, angle=angle, resize=True, order=3)
+    def rotate(img, angle, order=3):
+        """Rotate an image by a given angle (frame resized to fit rotated image)
+
+        Uses OpenCV's warpAffine, with the same output frame as
+        imgbasics.transform.rotate(img, angle, resize=True, order=order)
+        order: interpolation order, 0 (nearest), 1 (bilinear), 3 (bicubic)
+        """
+        if not angle % 360:
+            return img
+        sy, sx, *_ = img.shape
+        matrix, output_size = rotation_matrix(angle, sx, sy)
+        flags = INTERPOLATION_ORDERS[order]
+        return cv2.warpAffine(img, matrix, dsize=output_size, flags=flags)
 
     @staticmethod
     def crop(img, zone):
-        """Crop an image to zone (X0, Y0, Width, Height)"""
-        return imgbasics.imcrop(img, zone)
+        """Crop an image to zone (X0, Y0, Width, Height)
+
+        Returns a contiguous copy rather than a view of the full image, so that
+        later transforms (OpenCV, filters) work on contiguous data and so that
+        cached / stored crops do not keep the full image in memory.
+        A zone covering exactly the full image returns the image unchanged.
+        """
+        x0, y0, w, h = zone
+        ny, nx, *_ = img.shape
+        if (x0, y0, w, h) == (0, 0, nx, ny):
+            return img
+        return np.ascontiguousarray(imgbasics.imcrop(img, zone))
 
     @staticmethod
-    def subtract(img, img_ref, relative=False):
-        """How to subtract a reference image to the image"""
+    def subtract(img, img_ref, relative=False, img_ref_inv=None):
+        """How to subtract a reference image to the image
+
+        img_ref_inv (optional): precalculated 1 / img_ref, used in relative
+        mode to multiply instead of dividing for every image.
+
+        Note: img_ref_inv is passed by image series only to this method, not
+        to subtract() methods of custom image managers.
+        """
+        img_sub = img - img_ref
         if not relative:
-            return img - img_ref
+            return img_sub
+        # in-place operations below to avoid allocating another full image
+        if img_ref_inv is None:
+            img_sub /= img_ref
         else:
-            return (img - img_ref) / img_ref
+            img_sub *= img_ref_inv
+        return img_sub
 
     @staticmethod
     def divide(img, value):
         """Divide image by value, but keep initial data type"""
         # Avoids problems, e.g. np.uint8(257) is actually 1
-        temp_img = np.clip(img / value, *max_pixel_range(img))
-        return temp_img.astype(img.dtype)
+        vmin, vmax = max_pixel_range(img)
+        # (division in float64 for integer images, so that truncation below
+        # gives the same values as img / value; clip and cast then reuse
+        # the same buffer)
+        temp_img = img / value
+        np.clip(temp_img, vmin, vmax, out=temp_img)
+        return temp_img.astype(img.dtype, copy=False)
 
     @staticmethod
     def rgb_to_grey(img):
         """How to convert an RGB image to grayscale"""
+        if img.dtype.name in ('uint8', 'uint16') and img.shape[-1] == 3:
+            # same values as rgb2gray (on [0, 1] floats) rescaled and
+            # truncated below, without rgb2gray's input checks and copies
+            _, vmax = max_pixel_range(img)
+            img_grey = (img * (1 / vmax)) @ np.array(GREY_WEIGHTS)
+            img_grey *= vmax
+            return img_grey.astype(img.dtype)
+        if img.dtype.kind == 'f' and img.shape[-1] == 3:
+            # same as rgb2gray for floats (no rescaling), in a single pass
+            return img @ np.array(GREY_WEIGHTS, dtype=img.dtype)
         _, vmax = max_pixel_range(img)
         img_grey = skimage.color.rgb2gray(img)
         if type(vmax) is int:
@@ -98,15 +334,23 @@ class ImageManager:
             return img_grey
 
     @staticmethod
-    def filter(img, filter_type='gaussian', size=1):
-        """Crop an image to zone (X0, Y0, Width, Height)"""
-        _, vmax = max_pixel_range(img)
-        if filter_type == 'gaussian':
-            img_filtered = filters.gaussian(img, sigma=size)
+    def filter(img, filter_type='gaussian', size=1, approximate=False):
+        """Filter / blur image with filter of given type and size (sigma)
+
+        approximate: if True, use faster, approximate filtering for large
+                     sizes (e.g., for interactive previews)
+        """
+        if not size:
+            return img
+        if filter_type == 'gaussian' and approximate:
+            img_filtered = gaussian_filter_approx(img, sigma=size)
+        elif filter_type == 'gaussian':
+            img_filtered = gaussian_filter(img, sigma=size)
         else:
             raise ValueError(f'{filter_type} filter not implemented')
+        _, vmax = max_pixel_range(img)
         if type(vmax) is int:
-            return (img_filtered * vmax).astype(img.dtype)
+            return img_filtered.astype(img.dtype)
         else:
             return img_filtered
 
@@ -120,8 +364,13 @@ class ImageManager:
             val_min, val_max = max_pixel_range(img)
             vmin = val_min if vmin is None else vmin
             vmax = val_max if vmax is None else vmax
-        condition = (img >= vmin) & (img <= vmax)
-        return np.where(condition, True, False)
+        # (non-finite bounds, e.g. -inf or nan, are left to numpy comparisons)
+        if img.ndim == 2 and img.dtype.name in PIXEL_DEPTHS \
+                and math.isfinite(vmin) and math.isfinite(vmax):
+            return integer_threshold(img, vmin, vmax)
+        condition = img >= vmin
+        condition &= img <= vmax
+        return condition
 
 
 class FileManager:
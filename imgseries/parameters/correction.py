@@ -5,6 +5,9 @@ impacting further analysis of the images, similarly to transform parameters.
 """
 
 
+# Non-standard imports
+import numpy as np
+
 # Local imports
 from .parameters_base import CorrectionParameter
 
@@ -14,6 +17,44 @@ class Flicker(CorrectionParameter):
 
     parameter_type = 'flicker'
 
+    def __init__(self, img_series):
+        super().__init__(img_series)
+        # (correction dataframe, ratio values, num of first image)
+        self._ratio_lookup = None
+
+    def load(self, filename=None):
+        super().load(filename=filename)
+        self._ratio_lookup = None
+
+    def reset(self):
+        super().reset()
+        self._ratio_lookup = None
+
+    def _get_ratio_lookup(self):
+        """Ratios as array, rebuilt when data['correction'] is replaced."""
+        correction = self.data['correction']
+        if self._ratio_lookup is None or self._ratio_lookup[0] is not correction:
+            ratio = correction['ratio']
+            nums = ratio.index.to_numpy()
+            start = None
+            if nums.size and np.issubdtype(nums.dtype, np.integer):
+                if np.array_equal(nums, np.arange(nums[0], nums[0] + nums.size)):
+                    start = int(nums[0])
+            self._ratio_lookup = correction, ratio.to_numpy(), start
+        return self._ratio_lookup
+
+    def get_ratio(self, num):
+        """Flicker ratio of image num (same as data['correction']['ratio'].loc[num])
+
+        Ratios are kept as an array, updated by load() or when a new dataframe
+        is assigned to data['correction']; call load() again (or assign a new
+        dataframe) after modifying data['correction'] in place.
+        """
+        correction, ratios, start = self._get_ratio_lookup()
+        if start is not None and 0 <= num - start < ratios.size:
+            return ratios[num - start]
+        return correction['ratio'].loc[num]
+
 
 class Shaking(CorrectionParameter):
     """Class to store flicker correction transform"""
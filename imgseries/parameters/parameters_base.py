@@ -1,7 +1,6 @@
 """Base classes for display / transform / analysis parameters"""
 
 
-import pandas as pd
 from ..config import CONFIG, FILENAMES
 
 
@@ -5,8 +5,13 @@ impacting further analysis of the images.
 """
 
 # Standard library
-from math import pi
+from concurrent.futures import ThreadPoolExecutor
+from math import atan2, degrees
 from functools import lru_cache
+from pathlib import Path
+import hashlib
+import json
+import os
 
 # Non-standard modules
 import matplotlib.pyplot as plt
@@ -18,6 +23,8 @@ from drapo import linput
 
 # Local imports
 from .parameters_base import TransformParameter
+from ..config import CONFIG
+from ..managers import ImageManager
 from ..viewers import ThresholdSetterViewer
 
 
@@ -48,6 +55,11 @@ class Rotation(TransformParameter):
 
     parameter_type = 'rotation'
 
+    def __init__(self, img_series):
+        super().__init__(img_series)
+        # Interpolation order used when rotating images (3: bicubic)
+        self.interpolation_order = 3
+
     def define(self, num=0, vertical=False, **kwargs):
         """Interactively define rotation angle by drawing a line.
 
@@ -82,7 +94,7 @@ class Rotation(TransformParameter):
         dy = y1 - y2
         a, b = (dx, dy) if vertical else (dy, -dx)
 
-        angle = - np.arctan2(a, b) * 180 / pi
+        angle = - degrees(atan2(a, b))
         plt.close(fig)
 
         self.data = {'angle': angle}
@@ -99,7 +111,15 @@ class Rotation(TransformParameter):
           (note: cmap is grey by default for 2D images)
         """
         _, ax = plt.subplots()
-        img = self.img_series.read(num=num)
+
+        # Bilinear interpolation is enough for a preview; img_reader is used
+        # directly so that the preview does not end up in the read() cache
+        self.interpolation_order = 1
+        try:
+            img = self.img_series.img_reader.read(num=num)
+        finally:
+            self.interpolation_order = 3
+
         self.img_series._imshow(img, ax=ax, **kwargs)
 
         try:
@@ -223,17 +243,30 @@ class Filter(TransformParameter):
         img = self.img_series.read(num=num)
         imshow = self.img_series._imshow(img, ax=ax, **kwargs)
 
-        @lru_cache(maxsize=516)
-        def filter_image(size):
-            return self.img_series.img_transformer.img_manager.filter(
+        # Each entry is a full filtered image: keep the cache small.
+        # Sizes are cached in units of the slider step (0.1) so that float
+        # noise in slider values (e.g. 0.30000000000000004) hits the cache
+        img_manager = self.img_series.img_transformer.img_manager
+
+        # faster preview for large sizes, only with the default ImageManager
+        # (custom image managers can keep a filter(img, filter_type, size))
+        filter_kwargs = {}
+        if img_manager.filter is ImageManager.filter:
+            filter_kwargs['approximate'] = True
+
+        @lru_cache(maxsize=16)
+        def filter_image(size_key):
+            return img_manager.filter(
                 img=img,
                 filter_type='gaussian',
-                size=size,
+                size=size_key / 10,
+                **filter_kwargs,
             )
 
         def update_image(size):
-            self.size = size
-            img = filter_image(size)
+            size_key = round(size * 10)
+            self.size = size_key / 10
+            img = filter_image(size_key)
             imshow.set_array(img)
 
         self.size = 1
@@ -249,6 +282,9 @@ class Filter(TransformParameter):
 
         slider.on_changed(update_image)
 
+        # The returned slider keeps filter_image alive: free cached images
+        fig.canvas.mpl_connect('close_event', lambda event: filter_image.cache_clear())
+
         self.data = {'type': 'gaussian', 'size': self.size}
 
         return slider
@@ -295,15 +331,136 @@ class Subtraction(TransformParameter):
 
     parameter_type = 'subtraction'
 
+    def __init__(self, img_series):
+        super().__init__(img_series)
+        self.reference_image = None
+        # 1 / reference_image, calculated once for relative subtraction
+        self.reference_image_inv = None
+
     def _calculate_reference(self, ref_nums):
-        imgs = []
-        for num in ref_nums:
-            imgs.append(self.img_series.read(num=num, subtraction=False))
-        img_stack = np.stack(imgs)
-        return img_stack.mean(axis=0)
+        """Average of reference images, accumulated one image at a time.
+
+        The result is float32 (or float64 for float64 images) so that
+        subtraction does not upcast integer images to float64.
+        """
+        img_series = self.img_series
+        raw_images = not img_series.active_corrections and \
+            img_series.active_transforms == [self.parameter_type]
+
+        if img_series.is_stack and raw_images:
+            return self._calculate_reference_from_stack(ref_nums)
+
+        img_sum = None
+
+        for img in self._read_references(ref_nums):
+            if img_sum is None:
+                img_sum = np.zeros(img.shape, dtype=np.float64)
+                dtype = np.result_type(img.dtype, np.float32)
+            img_sum += img
+
+        img_sum /= len(ref_nums)
+        return img_sum.astype(dtype)
+
+    def _read_references(self, ref_nums):
+        """Iterate over reference images (without subtraction), in order."""
+
+        def read_reference(num):
+            return self.img_series.read(num=num, subtraction=False)
+
+        # Custom image managers are not assumed to be thread-safe
+        if self.img_series.img_reader.img_manager is not ImageManager:
+            yield from map(read_reference, ref_nums)
+            return
+
+        # Images are read in threads to overlap file reading / decoding,
+        # but yielded in order, as they arrive
+        with ThreadPoolExecutor(max_workers=min(8, len(ref_nums))) as executor:
+            yield from executor.map(read_reference, ref_nums)
+
+    def _calculate_reference_from_stack(self, ref_nums):
+        """Average of reference images taken directly from the stack data.
+
+        Only valid if images are used raw (no corrections / other transforms).
+        """
+        data = self.img_series.data
+        # (negative nums converted to positive ones for the slice below)
+        nums = np.arange(len(data))[np.asarray(ref_nums)]
+        if (np.diff(nums) == 1).all():
+            imgs = data[nums[0]:nums[-1] + 1]  # view, no copy
+        else:
+            imgs = data[nums]
+        img_ref = imgs.mean(axis=0, dtype=np.float64)
+        return img_ref.astype(np.result_type(imgs.dtype, np.float32))
+
+    def _reference_cache_file(self, ref_nums):
+        """File in which the reference image is stored between sessions.
+
+        The name is a hash of the reference images (files and modification
+        times), of the image manager and of the corrections / other
+        transforms used to read them.
+        """
+        img_series = self.img_series
+
+        img_manager = img_series.img_reader.img_manager
+        if not isinstance(img_manager, type):
+            img_manager = type(img_manager)
+        img_manager_name = f'{img_manager.__module__}.{img_manager.__qualname__}'
+
+        if img_series.is_stack:
+            files = [img_series.path]
+        else:
+            files = [img_series.files[num].file for num in ref_nums]
+
+        parameters = {
+            name: getattr(img_series, name).data
+            for name in img_series.active_corrections + img_series.active_transforms
+            if name != self.parameter_type
+        }
+
+        key = hashlib.md5(repr(tuple(ref_nums)).encode())
+        key.update(img_manager_name.encode())
+        for file in files:
+            key.update(str(Path(file).resolve()).encode())
+            key.update(str(os.stat(file).st_mtime_ns).encode())
+        key.update(json.dumps(parameters, sort_keys=True, default=_to_str).encode())
+
+        folder = Path(CONFIG['reference cache'])
+        return folder / f'ref_{key.hexdigest()}.npy'
+
+    def _load_or_calculate_reference(self, ref_nums):
+        """Get reference image from disk cache if possible, else calculate it."""
+        if CONFIG['reference cache'] is None:
+            return self._calculate_reference(ref_nums)
+
+        file = self._reference_cache_file(ref_nums)
+        try:
+            return np.load(file)
+        except (OSError, ValueError):
+            pass
+
+        img_ref = self._calculate_reference(ref_nums)
+
+        # Write then rename so that an interrupted save does not leave
+        # a corrupted file behind
+        tmp_file = file.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_file, 'wb') as f:
+                np.save(f, img_ref)
+            os.replace(tmp_file, file)
+        except OSError:
+            pass
+
+        return img_ref
 
     def _update_reference_image(self):
-        self.reference_image = self._calculate_reference(self.reference)
+        if self.reference is None:  # e.g. only 'relative' defined
+            self.reference_image = None
+            self.reference_image_inv = None
+            return
+        self.reference_image = self._load_or_calculate_reference(self.reference)
+        with np.errstate(divide='ignore'):
+            self.reference_image_inv = 1 / self.reference_image
 
     @property
     def reference(self):
@@ -312,7 +469,7 @@ class Subtraction(TransformParameter):
     @reference.setter
     def reference(self, value):
         self.data['reference'] = tuple(value)
-        self.reference_image = self._calculate_reference(ref_nums=value)
+        self._update_reference_image()
         self._clear_cache()
 
     @property
@@ -365,6 +522,14 @@ class Threshold(TransformParameter):
         self._update_parameters()
 
 
+def _to_str(obj):
+    """Make parameter data (possibly incl. pandas objects) json-serializable"""
+    try:
+        return obj.to_json()
+    except AttributeError:
+        return str(obj)
+
+
 all_transforms = (
     Grayscale,
     Rotation,
@@ -1,11 +1,16 @@
 """Class ImgSeries for image series manipulation"""
 
 # Standard library
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+import os
+import shutil
 
 # Nonstandard
 import matplotlib.pyplot as plt
-from skimage import io
+from matplotlib.image import imsave
+import numpy as np
 from tqdm import tqdm
 
 # local imports
@@ -43,9 +48,16 @@ class ImageTransformer(ImageProcessor):
 
     def rotation(self, img):
         """Rotate image according to pre-defined rotation parameters"""
+        rotation = self.img_series.rotation
+        # order only passed when not default (preview in Rotation.define()),
+        # so that custom image managers can keep a rotate(img, angle) method
+        kwargs = {}
+        if rotation.interpolation_order != 3:
+            kwargs['order'] = rotation.interpolation_order
         return self.img_manager.rotate(
             img=img,
-            angle=self.img_series.rotation.data['angle'],
+            angle=rotation.data['angle'],
+            **kwargs,
         )
 
     def crop(self, img):
@@ -65,11 +77,19 @@ class ImageTransformer(ImageProcessor):
 
     def subtraction(self, img):
         """Subtract pre-set reference image to current image."""
-        img_ref = self.img_series.subtraction.reference_image
+        subtraction = self.img_series.subtraction
+        if subtraction.reference_image is None:  # e.g. only 'relative' defined
+            return img
+        # img_ref_inv only passed to the default ImageManager, so that custom
+        # image managers can keep a subtract(img, img_ref, relative) method
+        kwargs = {}
+        if subtraction.relative and self.img_manager.subtract is ImageManager.subtract:
+            kwargs['img_ref_inv'] = subtraction.reference_image_inv
         return self.img_manager.subtract(
             img=img,
-            img_ref=img_ref,
-            relative=self.img_series.subtraction.relative,
+            img_ref=subtraction.reference_image,
+            relative=subtraction.relative,
+            **kwargs,
         )
 
     def grayscale(self, img):
@@ -99,7 +119,7 @@ class ImageCorrector(ImageProcessor):
         """Flicker correction by dividing image by factor"""
         return self.img_manager.divide(
             img=img,
-            value=self.img_series.flicker.data['correction']['ratio'].loc[num]
+            value=self.img_series.flicker.get_ratio(num)
         )
 
     def shaking(self, img, num):
@@ -117,6 +137,23 @@ class ImageReader(ImageProcessor):
         - HDF5Reader (not implemented yet)
     """
 
+    def __init__(self, img_series, img_manager):
+        super().__init__(img_series=img_series, img_manager=img_manager)
+        # (name, parameter object, function) for each correction / transform,
+        # resolved at first read (see _get_steps())
+        self._correction_steps = None
+        self._transform_steps = None
+
+    def _get_steps(self, names, processor):
+        """Parameter objects and processing functions of corrections/transforms.
+
+        e.g. ('rotation', img_series.rotation, img_transformer.rotation)
+        """
+        return [
+            (name, getattr(self.img_series, name), getattr(processor, name))
+            for name in names
+        ]
+
     def apply_correction(self, img, num, correction_name):
         """Apply specific correction (str) to image and return new img array"""
         correction_object = getattr(self.img_series, correction_name)
@@ -127,14 +164,15 @@ class ImageReader(ImageProcessor):
 
     def apply_corrections(self, img, num, **kwargs):
         """Apply stored corrections on the image (flicker, shaking, etc.)"""
-        for correction_name in self.img_series.corrections:
+        if self._correction_steps is None:
+            self._correction_steps = self._get_steps(
+                names=self.img_series.corrections,
+                processor=self.img_series.img_corrector,
+            )
+        for name, correction_object, correction_function in self._correction_steps:
             # Do not consider any correction specifically marked as false
-            if kwargs.get(correction_name, True):
-                img = self.apply_correction(
-                    img=img,
-                    num=num,
-                    correction_name=correction_name,
-                )
+            if kwargs.get(name, True) and not correction_object.is_empty:
+                img = correction_function(img=img, num=num)
         return img
 
     def apply_transform(self, img, transform_name):
@@ -147,19 +185,26 @@ class ImageReader(ImageProcessor):
 
     def apply_transforms(self, img, **kwargs):
         """Apply stored transforms on the image (crop, rotation, etc.)"""
-        for transform_name in self.img_series.transforms:
+        if self._transform_steps is None:
+            self._transform_steps = self._get_steps(
+                names=self.img_series.transforms,
+                processor=self.img_series.img_transformer,
+            )
+        for name, transform_object, transform_function in self._transform_steps:
             # Do not consider any transform specifically marked as false
-            if kwargs.get(transform_name, True):
-                img = self.apply_transform(
-                    img=img,
-                    transform_name=transform_name,
-                )
+            if kwargs.get(name, True) and not transform_object.is_empty:
+                img = transform_function(img)
         return img
 
     def _read(self, num):
         """How to read image from series/stack. To be defined in subclasses"""
         pass
 
+    @property
+    def image_shape(self):
+        """Shape of raw images (subclasses can get it without reading data)"""
+        return self._read(num=0).shape
+
     def read(self, num, correction=True, transform=True, **kwargs):
         """Read image #num in image series and apply transforms if requested.
 
@@ -167,10 +212,43 @@ class ImageReader(ImageProcessor):
         transforms during the processing of the image
         """
         img = self._read(num=num)
-        img = self.apply_corrections(img, num, **kwargs) if correction else img
-        img = self.apply_transforms(img, **kwargs) if transform else img
+        if correction or transform:  # else, raw image
+            img = self.apply_corrections(img, num, **kwargs) if correction else img
+            img = self.apply_transforms(img, **kwargs) if transform else img
+        # Downstream numpy / OpenCV operations are faster on contiguous data
+        # (check only, no copy if already contiguous)
+        if not img.flags.c_contiguous:
+            img = np.ascontiguousarray(img)
         return img
 
+    def prefetch(self, nums, lookahead=4, **kwargs):
+        """Iterate over (num, img) for all nums, reading images in advance.
+
+        Up to lookahead images are read (and transformed) in background
+        threads while the current one is being used, which overlaps file
+        reading and processing for sequential access.
+        kwargs are passed to read().
+
+        Images are read one by one, without threads, for custom image
+        managers (not assumed to be thread-safe).
+        """
+        if self.img_manager is not ImageManager:
+            for num in nums:
+                yield num, self.read(num, **kwargs)
+            return
+
+        nums = iter(nums)
+        with ThreadPoolExecutor(max_workers=lookahead) as executor:
+
+            def submit(num):
+                return num, executor.submit(self.read, num, **kwargs)
+
+            pending = deque(submit(num) for num in islice(nums, lookahead))
+            while pending:
+                num, future = pending.popleft()
+                pending.extend(submit(num) for num in islice(nums, 1))
+                yield num, future.result()
+
 
 # ========================= MAIN IMAGE SERIES CLASS ==========================
 
@@ -239,9 +317,9 @@ class ImgSeriesBase:
 
     def _get_initial_image_dims(self):
         """Remember which type (B&W or color) and shape the raw images are"""
-        img = self.read()
-        self.ny, self.nx, *_ = img.shape
-        self.initial_ndim = img.ndim
+        shape = self.img_reader.image_shape
+        self.ny, self.nx, *_ = shape
+        self.initial_ndim = len(shape)
         self.ndim = self.initial_ndim
 
     # ===================== Corrections and  Transforms ======================
@@ -492,6 +570,16 @@ class ImgSeriesBase:
         - with_display: if True, export images with display options as well
           (e.g., contrast, colormap, etc.)
           NOT IMPLEMENTED YET
+
+        - parallel: if True or 'process', export images in parallel
+          processes; if 'thread', use threads instead (no pickling / process
+          startup; efficient when reading / writing files dominates, because
+          decoders and encoders release the GIL); if 'auto', use threads
+          when images are processed by the default ImageManager (whose
+          operations release the GIL) and without display, else processes;
+          if an int, number of parallel processes;
+          if False, export images one by one (next images being read in
+          background threads with the default ImageManager only).
         """
         export = Export(
             self,
@@ -510,6 +598,19 @@ class ImgSeriesBase:
         )
 
 
+# Export object in worker processes of Export.run() (set at worker init)
+_worker_export = None
+
+
+def _init_export_worker(export):
+    global _worker_export
+    _worker_export = export
+
+
+def _export_one(num):
+    _worker_export._run(num)
+
+
 class Export:
 
     def __init__(
@@ -528,18 +629,63 @@ class Export:
         self.ndigits = ndigits
         self.export_folder = self.img_series.savepath / folder
         self.export_folder.mkdir(exist_ok=True)
+        # Format of exported files, e.g. 'path/to/Export/Img-{num:05}.png'
+        # (str, not Path, to avoid building Path objects for each image)
+        prefix = f'{self.export_folder}{os.sep}{filename}'
+        prefix = prefix.replace('{', '{{').replace('}', '}}')
+        self.file_format = f'{prefix}{{num:0{ndigits}}}{extension}'
         self.with_display = with_display
+        # set at each run()
+        self.passthrough = False
+        self.display_kwargs = None
+
+    def _is_passthrough(self):
+        """Whether exported images are identical to the original files."""
+        img_series = self.img_series
+        img_manager = img_series.img_reader.img_manager
+        if img_series.is_stack or self.with_display:
+            return False
+        # Custom image managers can modify images when reading / writing them
+        if img_manager.read_image is not ImageManager.read_image:
+            return False
+        if img_manager.write_image is not ImageManager.write_image:
+            return False
+        if img_series.active_corrections or img_series.active_transforms:
+            return False
+        return img_series.extension.lower() == self.extension.lower()
+
+    def _get_auto_backend(self):
+        """'thread' if exporting mostly runs code that releases the GIL.
+
+        (file decoding / encoding and the OpenCV / scipy / numpy operations
+        of ImageManager); custom image managers or display exports (colormap
+        applied by matplotlib) use processes.
+        """
+        img_manager = self.img_series.img_reader.img_manager
+        if self.passthrough:  # only file copies
+            return 'thread'
+        if img_manager is ImageManager and not self.with_display:
+            return 'thread'
+        return 'process'
+
+    def _get_file(self, num):
+        return self.file_format.format(num=num)
 
     def _run(self, num):
+        if self.passthrough:  # no need to decode / re-encode image
+            shutil.copyfile(self.img_series.files[num].file, self._get_file(num))
+            return
         img = self.img_series.read(num=num)
-        fname = f'{self.filename}{num:0{self.ndigits}}{self.extension}'
-        file = self.export_folder / fname
+        self._save(num, img)
+
+    def _save(self, num, img):
+        file = self._get_file(num)
 
         if self.with_display:
-            kwargs = self.img_series._get_imshow_kwargs()
-            plt.imsave(file, img, **kwargs)
+            # (not pyplot's imsave, which goes through pyplot's state)
+            imsave(file, img, **self.display_kwargs)
         else:
-            io.imsave(file, img)
+            self.img_series.img_reader.img_manager.write_image(file, img)
 
     def run(
         self,
@@ -549,21 +695,62 @@ class Export:
         parallel=True,
     ):
         nums = self.img_series._set_substack(start, end, skip)
-
-        if not parallel:
+        self.passthrough = self._is_passthrough()
+        if self.with_display:
+            self.display_kwargs = self.img_series._get_imshow_kwargs()
+
+        n_workers = os.cpu_count() or 1
+
+        if isinstance(parallel, int) and not isinstance(parallel, bool):
+            if parallel < 0:
+                raise ValueError(f'Number of processes cannot be negative ({parallel})')
+            # number of worker processes (0: no parallel export)
+            n_workers = parallel
+            parallel = 'process' if parallel else False
+        elif parallel and parallel not in (True, 'process', 'thread', 'auto'):
+            raise ValueError(
+                "parallel must be True/False, 'process', 'thread', 'auto' "
+                f"or a number of processes, not {parallel}"
+            )
+
+        if parallel == 'auto':
+            parallel = self._get_auto_backend()
+
+        # Worker pools are not worth their startup (and pickling) cost for
+        # a single image, or processes for a single core
+        if len(nums) <= 1 or (n_workers == 1 and parallel != 'thread'):
+            parallel = False
+
+        if not parallel and self.passthrough:
             for num in tqdm(nums):
                 self._run(num)
             return
 
-        futures = {}
-
-        with ProcessPoolExecutor() as executor:
+        if not parallel:
+            # Next images are read while the current one is being saved
+            # (default ImageManager only, see ImageReader.prefetch())
+            images = self.img_series.img_reader.prefetch(nums)
+            for num, img in tqdm(images, total=len(nums)):
+                self._save(num, img)
+            return
 
-            for num in nums:
-                future = executor.submit(self._run, num)
-                futures[num] = future
+        if parallel == 'thread':
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                results = executor.map(self._run, nums)
+                for _ in tqdm(results, total=len(nums)):  # waitbar
+                    pass
+            return
 
-            # Waitbar ----------------------------------------------------
-            futures_list = list(futures.values())
-            for future in tqdm(as_completed(futures_list), total=len(nums)):
+        # Send images to workers in chunks (~8 per worker) rather than one
+        # by one, to limit inter-process communication
+        chunksize = max(1, len(nums) // (8 * n_workers))
+
+        # self (incl. image series) is sent only once to each worker
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_export_worker,
+            initargs=(self,),
+        ) as executor:
+            results = executor.map(_export_one, nums, chunksize=chunksize)
+            for _ in tqdm(results, total=len(nums)):  # waitbar
                 pass
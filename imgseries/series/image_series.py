@@ -1,12 +1,10 @@
 """Class ImgSeries for image series manipulation"""
 
-# Standard library imports
-from functools import lru_cache
-
 # Nonstandard
 import filo
 
 # local imports
+from ..cache import cached_read
 from ..config import CONFIG, IMAGE_TRANSFORMS, IMAGE_CORRECTIONS
 from ..managers import FileManager, ImageManager
 from ..viewers import ImgSeriesViewer
@@ -109,8 +107,13 @@ class ImgSeries(ImgSeriesBase, filo.Series):
 # ----------------------------------------------------------------------------
 
 
-def series(*args, cache=False, cache_size=516, **kwargs):
-    """Generator of ImgSeries object with a caching option."""
+def series(*args, cache=False, cache_size=516, cache_bytes=None, **kwargs):
+    """Generator of ImgSeries object with a caching option.
+
+    - cache_size: max number of images kept in the cache
+    - cache_bytes: max total size (in bytes) of images kept in the cache
+                   (None: no limit other than cache_size)
+    """
     if not cache:
 
         return ImgSeries(*args, **kwargs)
@@ -121,7 +124,7 @@ def series(*args, cache=False, cache_size=516, **kwargs):
 
             cache = True
 
-            @lru_cache(maxsize=cache_size)
+            @cached_read(maxsize=cache_size, maxbytes=cache_bytes)
             def read(self, num=0, transform=True, **kwargs):
                 return super().read(num, transform=transform, **kwargs)
 
@@ -2,9 +2,12 @@
 
 # Standard library imports
 from pathlib import Path
-from functools import lru_cache
+
+# Nonstandard
+import numpy as np
 
 # local imports
+from ..cache import cached_read
 from ..config import IMAGE_TRANSFORMS, IMAGE_CORRECTIONS
 from ..managers import FileManager, ImageManager
 from ..viewers import ImgSeriesViewer
@@ -16,13 +19,38 @@ class TiffStackReader(ImageReader):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.data = self.img_manager.read_tiff_stack_whole(
-            file=self.img_series.path,
-        )
+        self.path = self.img_series.path
+        # Memory-map the stack if possible so that only the images that are
+        # actually read are loaded; else (e.g. compressed), load it all.
+        try:
+            self.data = self.img_manager.read_tiff_stack_memmap(file=self.path)
+        except ValueError:
+            self.data = self.img_manager.read_tiff_stack_whole(file=self.path)
+        # Memory-mapped data can be big-endian, which OpenCV does not handle
+        self.dtype = self.data.dtype.newbyteorder('=')
+
+    def __getstate__(self):
+        # Pickling a memmap copies all its data (e.g. to every worker of a
+        # parallel export): map the file again when unpickling instead.
+        state = self.__dict__.copy()
+        if isinstance(self.data, np.memmap):
+            state['data'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.data is None:
+            self.data = self.img_manager.read_tiff_stack_memmap(file=self.path)
 
     def _read(self, num):
-        """read raw image from stack"""
-        return self.data[num]
+        """read raw image from stack (in-memory copy, native byte order)"""
+        return np.array(self.data[num], dtype=self.dtype)
+
+    @property
+    def image_shape(self):
+        """Shape of raw images, from stack data (no image read)"""
+        _, *shape = self.data.shape
+        return tuple(shape)
 
     @property
     def number_of_images(self):
@@ -109,10 +137,13 @@ class ImgStack(ImgSeriesBase):
             img_manager=img_manager,
         )
 
-        self.data = self.img_reader.data
-
         self._get_initial_image_dims()
 
+    @property
+    def data(self):
+        """Raw stack data (memory-mapped if possible)"""
+        return self.img_reader.data
+
     def _set_substack(self, start, end, skip):
         """Generate subset of image numbers to be displayed/analyzed."""
         npts = self.img_reader.number_of_images
@@ -126,8 +157,13 @@ class ImgStack(ImgSeriesBase):
 # ----------------------------------------------------------------------------
 
 
-def stack(*args, cache=False, cache_size=516, **kwargs):
-    """Generator of ImgSeries object with a caching option."""
+def stack(*args, cache=False, cache_size=516, cache_bytes=None, **kwargs):
+    """Generator of ImgStack object with a caching option.
+
+    - cache_size: max number of images kept in the cache
+    - cache_bytes: max total size (in bytes) of images kept in the cache
+                   (None: no limit other than cache_size)
+    """
     if not cache:
 
         return ImgStack(*args, **kwargs)
@@ -138,7 +174,7 @@ def stack(*args, cache=False, cache_size=516, **kwargs):
 
             cache = True
 
-            @lru_cache(maxsize=cache_size)
+            @cached_read(maxsize=cache_size, maxbytes=cache_bytes)
             def read(self, num=0, transform=True, **kwargs):
                 return super().read(num, transform=transform, **kwargs)
 
@@ -6,10 +6,19 @@ Jupyter notebook for more details and interactive modes.
 
 # Standard library
 from pathlib import Path
+import gc
+import os
+import weakref
+
+# Nonstandard
+import numpy as np
+import pandas as pd
 
 # Local imports
 import imgseries
 from imgseries import series, stack
+from imgseries.config import CONFIG
+from imgseries.managers import ImageManager
 
 
 # =============================== Misc. config ===============================
@@ -67,6 +76,158 @@ def test_load_global_transform():
     assert img_tot.shape == (380, 467)
 
 
+def test_subtraction_reference():
+    """Reference image for subtraction is the average of reference images"""
+    images.reset_transforms()
+    images.subtraction.reference = (3, 4, 5)
+    img_ref = images.subtraction.reference_image
+    imgs = [images.read(num, transform=False) for num in (3, 4, 5)]
+    images.subtraction.reset()
+    assert img_ref.shape == (550, 608)
+    assert abs(img_ref - np.mean(imgs, axis=0)).max() < 1e-3
+
+
+def test_subtraction_relative_only():
+    """Setting relative subtraction before any reference image"""
+    images.reset_transforms()
+    images.subtraction.relative = True
+    img = images.read(3)
+    images.subtraction.reset()
+    assert (img == images.read(3)).all()
+
+
+def test_subtraction_reference_stack():
+    """Reference image of a stack, including negative image numbers"""
+    for ref_nums in (3, 4, 5), (-2, -1), (-1,):
+        img_stack.subtraction.reference = ref_nums
+        img_ref = img_stack.subtraction.reference_image
+        imgs = [img_stack.read(num, transform=False) for num in ref_nums]
+        img_stack.subtraction.reset()
+        assert np.allclose(img_ref, np.mean(imgs, axis=0), rtol=1e-6)
+
+
+def test_subtraction_reference_cache(tmp_path):
+    """Reference image for subtraction stored on disk and reloaded"""
+    images_custom = series(folders, savepath=basefolder, img_manager=HalfImageManager)
+    CONFIG['reference cache'] = tmp_path
+    try:
+        images.reset_transforms()
+        images.subtraction.reference = (3, 4, 5)
+        img_ref = images.subtraction.reference_image
+        images.subtraction.reference = (3, 4, 5)
+        img_ref_loaded = images.subtraction.reference_image
+        # not loaded from the file of another image manager
+        images_custom.subtraction.reference = (3, 4, 5)
+        img_ref_custom = images_custom.subtraction.reference_image
+    finally:
+        CONFIG['reference cache'] = None
+        images.subtraction.reset()
+    assert len(list(tmp_path.glob('ref_*.npy'))) == 2
+    assert (img_ref == img_ref_loaded).all()
+    assert not (img_ref == img_ref_custom).all()
+
+
+def test_filter_uniform_image():
+    """Large gaussian filter (FFT) leaves uniform integer images unchanged"""
+    for dtype, value in ((np.uint8, 255), (np.uint8, 100), (np.uint16, 1000)):
+        img = np.full((120, 150), value, dtype=dtype)
+        img_filtered = ImageManager.filter(img, size=8)
+        assert img_filtered.dtype == dtype
+        assert (img_filtered == value).all()
+
+
+def test_divide():
+    """Division of integer images (flicker correction) truncates as img / value"""
+    rng = np.random.default_rng(0)
+    for dtype, vmax in ((np.uint8, 255), (np.uint16, 65535)):
+        img = rng.integers(0, vmax + 1, size=(100, 100), dtype=dtype)
+        for value in (0.3, 1.1, 2):
+            img_div = np.clip(img / value, 0, vmax).astype(dtype)
+            assert (ImageManager.divide(img, value) == img_div).all()
+
+
+def test_threshold_infinite_bounds():
+    """Thresholds of integer images with non-finite bounds"""
+    img = np.arange(256, dtype=np.uint8).reshape((16, 16))
+    assert (ImageManager.threshold(img, vmin=-np.inf, vmax=100) == (img <= 100)).all()
+    assert (ImageManager.threshold(img, vmin=10, vmax=np.inf) == (img >= 10)).all()
+    assert not ImageManager.threshold(img, vmin=np.nan, vmax=100).any()
+
+
+def test_flicker_ratio():
+    """Flicker ratios, with contiguous or non-contiguous image numbers"""
+    ratio = pd.Series([0.5, 1, 2], index=pd.Index([4, 5, 6], name='num'))
+    images.flicker.data['correction'] = pd.DataFrame({'ratio': ratio})
+    try:
+        assert images.flicker.get_ratio(4) == 0.5
+        assert images.flicker.get_ratio(6) == 2
+        # non-contiguous numbers use the dataframe index
+        ratio = pd.Series([0.5, 1, 2], index=pd.Index([4, 6, 9], name='num'))
+        images.flicker.data['correction'] = pd.DataFrame({'ratio': ratio})
+        assert images.flicker.get_ratio(6) == 1
+        assert images.flicker.get_ratio(9) == 2
+    finally:
+        images.flicker.reset()
+
+
+def test_cache_bytes():
+    """Cached series keeps images within the given memory budget"""
+    img_nbytes = 550 * 608  # 8-bit images
+    images_cached = series(folders, savepath=basefolder, cache=True,
+                           cache_bytes=3 * img_nbytes)
+    images_cached.read.cache_clear()
+    for num in range(5):
+        images_cached.read(num)
+    images_cached.read(4)
+    info = images_cached.read.cache_info()
+    assert info.currsize == 3
+    assert info.nbytes == 3 * img_nbytes
+    assert info.hits == 1
+
+
+def test_cache_release():
+    """Cached series (and their images) can be garbage-collected"""
+    images_cached = series(folders, savepath=basefolder, cache=True)
+    images_cached.read(1)
+    ref = weakref.ref(images_cached)
+    del images_cached
+    gc.collect()
+    assert ref() is None
+
+
+class HalfImageManager(ImageManager):
+    """Custom image manager, modifying images when reading them"""
+
+    @staticmethod
+    def read_image(file):
+        return ImageManager.read_image(file) // 2
+
+
+def test_export(tmp_path, monkeypatch):
+    """Exported images are the same as read(), for all parallel options"""
+    # so that worker pools are used even on single-core machines
+    monkeypatch.setattr(os, 'cpu_count', lambda: 2)
+
+    images_export = series(folders, savepath=tmp_path)
+    images_custom = series(folders, savepath=tmp_path, img_manager=HalfImageManager)
+
+    for img_series in images_export, images_custom:
+        for crop in None, (186, 193, 391, 500):  # (None: copy of files)
+            img_series.crop.reset()
+            if crop is not None:
+                img_series.crop.zone = crop
+            for parallel in False, True, 'process', 'thread', 'auto', 2:
+                for start, end in (0, 3), (5, 6):  # (5, 6): single image
+                    folder = tmp_path / 'Export'
+                    for file in folder.glob('*'):
+                        file.unlink()
+                    img_series.export(start=start, end=end, parallel=parallel)
+                    for num in range(start, end):
+                        file = folder / f'Img-{num:05}.png'
+                        img = ImageManager.read_image(file)
+                        assert (img == img_series.read(num)).all()
+
+
 def test_img_time():
     """General test of setting and getting image times."""
     n = 33